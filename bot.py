@@ -4,7 +4,12 @@ import os
 import requests
 import logging
 import csv
+import json
+import time
+import asyncio
 import tempfile
+import threading
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
@@ -17,6 +22,21 @@ from collections import Counter
 load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 MORALIS_API_KEY = os.getenv("MORALIS_API_KEY")
+MORALIS_BASE_URL = "https://solana-gateway.moralis.io"
+
+# Warm-up / cache settings
+# Cached holders can be up to CACHE_TTL seconds old; set CACHE_TTL=0 or CACHE_MAX_SIZE=0 to always fetch live
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1000"))
+MORALIS_TIMEOUT = int(os.getenv("MORALIS_TIMEOUT", "10"))
+WARMUP_TIMEOUT = int(os.getenv("WARMUP_TIMEOUT", "30"))
+WARMUP_TOKENS = [t.strip() for t in os.getenv("WARMUP_TOKENS", "").split(",") if t.strip()]
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "10"))
+QUERY_STATS_FILE = os.getenv("QUERY_STATS_FILE", "query_stats.json")
+
+TOKEN_ADDRESS_PATTERN = r"[1-9A-HJ-NP-Za-km-z]{32,44}"
+
+START_TIME = time.monotonic()
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -42,25 +62,149 @@ def generate_csv(filename: str, rows: list, headers: list) -> str:
         writer.writerows(rows)
     return temp_path.name
 
-def fetch_token_metadata(token_address):
-    url = f"https://solana-gateway.moralis.io/token/mainnet/{token_address}/metadata"
-    headers = {
+# Shared HTTP session so the Moralis TLS connection is reused between requests
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+metadata_cache = {}
+top_holders_cache = {}
+# Caches are written from warm-up worker threads as well as the event loop thread
+cache_lock = threading.Lock()
+query_counter = Counter()
+
+def _cache_get(cache, key):
+    with cache_lock:
+        entry = cache.get(key)
+    if entry and time.monotonic() - entry[0] < CACHE_TTL:
+        return entry[1]
+    return None
+
+def _cache_set(cache, key, value):
+    if CACHE_TTL <= 0 or CACHE_MAX_SIZE <= 0:
+        return
+    # Drop expired entries, then the oldest ones, so the cache can't grow without bound
+    with cache_lock:
+        now = time.monotonic()
+        for k in [k for k, (ts, _) in cache.items() if now - ts >= CACHE_TTL]:
+            del cache[k]
+        cache.pop(key, None)
+        while cache and len(cache) >= CACHE_MAX_SIZE:
+            del cache[next(iter(cache))]
+        cache[key] = (now, value)
+
+def _moralis_headers():
+    return {
         "Accept": "application/json",
         "X-API-Key": MORALIS_API_KEY
     }
+
+def fetch_token_metadata(token_address):
+    cached = _cache_get(metadata_cache, token_address)
+    if cached is not None:
+        return cached
+    url = f"{MORALIS_BASE_URL}/token/mainnet/{token_address}/metadata"
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=_moralis_headers(), timeout=MORALIS_TIMEOUT)
         if response.status_code != 200:
             return None
-        return response.json()
+        data = response.json()
+        _cache_set(metadata_cache, token_address, data)
+        return data
     except Exception as e:
         logging.error(f"Error fetching metadata: {e}")
         return None
 
+def fetch_top_holders(token_address):
+    # Returns None on a non-200 response; network errors are left to the caller
+    cached = _cache_get(top_holders_cache, token_address)
+    if cached is not None:
+        return cached
+    url = f"{MORALIS_BASE_URL}/token/mainnet/{token_address}/top-holders"
+    response = session.get(url, headers=_moralis_headers(), timeout=MORALIS_TIMEOUT)
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    _cache_set(top_holders_cache, token_address, data)
+    return data
+
+def record_query(token_address):
+    query_counter[token_address] += 1
+
+def load_query_stats():
+    try:
+        with open(QUERY_STATS_FILE) as f:
+            return Counter(json.load(f))
+    except FileNotFoundError:
+        return Counter()
+    except Exception as e:
+        logging.error(f"Error loading query stats: {e}")
+        return Counter()
+
+def save_query_stats():
+    # Nothing queried (e.g. a quick restart): keep the previous run's hot list as it is
+    if not query_counter:
+        return
+    # Halve older counts before adding this run's, so trending tokens push out stale ones
+    stats = Counter({k: v / 2 for k, v in load_query_stats().items() if v / 2 >= 1})
+    stats.update(query_counter)
+    try:
+        stats_dir = os.path.dirname(os.path.abspath(QUERY_STATS_FILE))
+        fd, temp_path = tempfile.mkstemp(dir=stats_dir, prefix=".query_stats_", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(stats.most_common(100)), f)
+        os.replace(temp_path, QUERY_STATS_FILE)
+    except Exception as e:
+        logging.error(f"Error saving query stats: {e}")
+
+def warm_up_tokens():
+    tokens = list(dict.fromkeys(WARMUP_TOKENS))
+    for token_address, _ in load_query_stats().most_common(WARMUP_TOP_N):
+        if token_address not in tokens:
+            tokens.append(token_address)
+    return [t for t in tokens if re.fullmatch(TOKEN_ADDRESS_PATTERN, t)]
+
+def prefetch_token(token_address):
+    metadata = fetch_token_metadata(token_address)
+    try:
+        data = fetch_top_holders(token_address)
+    except Exception as e:
+        logging.error(f"Warm-up fetch error for {token_address}: {e}")
+        return False
+    return metadata is not None and data is not None
+
+async def warm_up(app):
+    # Runs after the Telegram connection is initialized and before polling starts
+    warm_start = time.monotonic()
+    # Bounded by WARMUP_TIMEOUT so a slow Moralis can never keep the bot from starting.
+    # Worker threads can't be cancelled: late prefetches finish in the background,
+    # each request bounded by MORALIS_TIMEOUT.
+    tokens = warm_up_tokens()
+    failed = 0
+    pending = set()
+    if tokens:
+        tasks = {asyncio.create_task(asyncio.to_thread(prefetch_token, t)): t for t in tokens}
+        done, pending = await asyncio.wait(tasks, timeout=WARMUP_TIMEOUT)
+        failed = sum(1 for task in done if not task.result())
+        for task in pending:
+            logging.warning(
+                f"Warm-up prefetch for {tasks[task]} did not finish within {WARMUP_TIMEOUT}s, "
+                f"continuing in the background"
+            )
+    else:
+        try:
+            await asyncio.to_thread(session.head, MORALIS_BASE_URL, timeout=MORALIS_TIMEOUT)
+        except Exception as e:
+            logging.error(f"Error opening Moralis connection: {e}")
+    logging.info(
+        f"Warm-up prefetched {len(tokens) - failed - len(pending)}/{len(tokens)} tokens "
+        f"({failed} failed, {len(pending)} timed out) in {time.monotonic() - warm_start:.2f}s, "
+        f"startup_time_seconds={time.monotonic() - START_TIME:.2f}"
+    )
+
 # --- /holders command ---
 async def token_address_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = update.message.text.strip()
-    matches = re.findall(r"[1-9A-HJ-NP-Za-km-z]{32,44}", message_text)
+    matches = re.findall(TOKEN_ADDRESS_PATTERN, message_text)
     if not matches:
         return
     address = matches[0]
@@ -126,19 +270,13 @@ async def holders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         symbol = "holders"
 
-    url = f"https://solana-gateway.moralis.io/token/mainnet/{token_address}/top-holders"
-    headers = {
-        "accept": "application/json",
-        "X-API-Key": MORALIS_API_KEY
-    }
-
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
+        data = fetch_top_holders(token_address)
+        if data is None:
             await update.message.reply_text("No record found.")
             return
+        record_query(token_address)
 
-        data = response.json()
         holders = data.get("result", [])
         if not holders:
             await update.message.reply_text("No record found.")
@@ -207,18 +345,12 @@ async def query(update: Update, context: ContextTypes.DEFAULT_TYPE):
         symbol = metadata.get("symbol", token_address[:4]).replace("/", "_") if metadata else token_address[:4]
         symbol_list.append(symbol)
 
-        url = f"https://solana-gateway.moralis.io/token/mainnet/{token_address}/top-holders"
-        headers = {
-            "accept": "application/json",
-            "X-API-Key": MORALIS_API_KEY
-        }
-
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
+            data = fetch_top_holders(token_address)
+            if data is None:
                 continue
+            record_query(token_address)
 
-            data = response.json()
             for holder in data.get("result", []):
                 percentage = float(holder.get("percentageRelativeToTotalSupply", 0))
                 if percentage < min_percent:
@@ -276,17 +408,11 @@ async def find(update: Update, context: ContextTypes.DEFAULT_TYPE):
         symbol = metadata.get("symbol", token_address[:4]).replace("/", "_") if metadata else token_address[:4]
         symbol_list.append(symbol)
 
-        url = f"https://solana-gateway.moralis.io/token/mainnet/{token_address}/top-holders"
-        headers = {
-            "accept": "application/json",
-            "X-API-Key": MORALIS_API_KEY
-        }
-
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
+            data = fetch_top_holders(token_address)
+            if data is None:
                 continue
-            data = response.json()
+            record_query(token_address)
             holders = set()
             for holder in data.get("result", []):
                 if float(holder.get("percentageRelativeToTotalSupply", 0)) >= min_percent:
@@ -314,12 +440,15 @@ async def find(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- Bot Start ---
 def main():
-    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).post_init(warm_up).build()
     app.add_handler(CommandHandler("holders", holders))
     app.add_handler(CommandHandler("query", query))
     app.add_handler(CommandHandler("find", find))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, token_address_handler))
-    app.run_polling()
+    try:
+        app.run_polling()
+    finally:
+        save_query_stats()
 
 if __name__ == "__main__":
     main()